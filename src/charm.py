@@ -4,8 +4,11 @@
 
 """Charm the service."""
 
+import hashlib
+import json
 import logging
 import subprocess  # nosec B404
+from functools import cached_property
 
 import ops
 from charms.data_platform_libs.v0.data_interfaces import (
@@ -27,12 +30,14 @@ from ops.pebble import CheckStatus, ExecError
 
 from literals import (
     ADMIN_ENTRYPOINT,
+    ADMIN_TEMPLATE,
     APP_NAME,
     APPLICATION_PORT,
     LOG_FILES,
     METRICS_PORT,
     RELATION_VALUES,
     USERSYNC_ENTRYPOINT,
+    USERSYNC_TEMPLATE,
 )
 from relations.ldap import LDAPRelationHandler
 from relations.opensearch import OpensearchRelationHandler
@@ -40,11 +45,24 @@ from relations.postgres import PostgresRelationHandler
 from relations.provider import RangerProvider
 from state import State
 from structured_config import CharmConfig
-from utils import generate_password, log_event_handler, render
+from utils import (
+    config_digest,
+    generate_password,
+    log_event_handler,
+    push_if_changed,
+    render,
+)
 
 # Log messages can be retrieved using juju debug-log
 logger = logging.getLogger(__name__)
 
+# Usersync config fields and the environment variables they are exposed as.
+_SYNC_KEY_MAP = {
+    name: name.upper()
+    for name in CharmConfig.__fields__
+    if name.startswith("sync")
+}
+
 
 class RangerK8SCharm(TypedCharmBase[CharmConfig]):
     """Charm the service.
@@ -55,12 +73,45 @@ class RangerK8SCharm(TypedCharmBase[CharmConfig]):
     """
 
     config_type = CharmConfig
+    _stored = ops.StoredState()
+    # Peer relation changes are observed for every charm function, as
+    # non-leader admin units rely on them to pick up the shared state.
+    _OBSERVERS = (
+        ("install", "_on_install"),
+        ("ranger_pebble_ready", "_on_ranger_pebble_ready"),
+        ("config_changed", "_on_config_changed"),
+        ("update_status", "_on_update_status"),
+        ("restart_action", "_on_restart"),
+        ("peer_relation_changed", "_on_peer_relation_changed"),
+    )
+
+    _SERVICE_TEMPLATE = {"startup": "enabled", "override": "replace"}
+
+    _ADMIN_CHECKS = {
+        "up": {
+            "override": "replace",
+            "period": "10s",
+            "http": {"url": "http://localhost:6080/"},
+        }
+    }
 
     @property
     def external_hostname(self):
         """Return the DNS listing used for external connections."""
         return self.config["external-hostname"] or self.app.name
 
+    @property
+    def _peer_relation(self):
+        """Return the peer relation, looked up once per hook once it exists."""
+        if self._peer is None:
+            self._peer = self.model.get_relation("peer")
+        return self._peer
+
+    @cached_property
+    def _container(self):
+        """Return the workload container, looked up once per hook."""
+        return self.unit.get_container(self.name)
+
     def __init__(self, *args):
         """Construct.
 
@@ -68,19 +119,21 @@ class RangerK8SCharm(TypedCharmBase[CharmConfig]):
             args: Ignore.
         """
         super().__init__(*args)
-        self._state = State(self.app, lambda: self.model.get_relation("peer"))
+        # A missing peer relation is looked up again, as it may be created
+        # later on while the same charm object handles other events.
+        self._peer = None
+        self._state = State(self.app, lambda: self._peer_relation)
+        self._stored.set_default(
+            applied_digest=None,
+            validated_digest=None,
+        )
         self.name = "ranger"
+        self._java_home = None
 
-        self.framework.observe(self.on.install, self._on_install)
-        self.framework.observe(
-            self.on.ranger_pebble_ready, self._on_ranger_pebble_ready
-        )
-        self.framework.observe(self.on.config_changed, self._on_config_changed)
-        self.framework.observe(self.on.update_status, self._on_update_status)
-        self.framework.observe(self.on.restart_action, self._on_restart)
-        self.framework.observe(
-            self.on.peer_relation_changed, self._on_peer_relation_changed
-        )
+        for event_name, handler in self._OBSERVERS:
+            self.framework.observe(
+                getattr(self.on, event_name), getattr(self, handler)
+            )
 
         self.postgres_relation = DatabaseRequires(
             self,
@@ -187,14 +240,22 @@ class RangerK8SCharm(TypedCharmBase[CharmConfig]):
             return
 
         charm_function = self.config["charm-function"].value
-        if charm_function == "usersync":
-            self.unit.status = ActiveStatus("Status check: UP")
+        if charm_function == "admin" and not self._state.database_connection:
             return
 
-        if not self._state.database_connection:
+        self._set_status_from_check(charm_function)
+
+    def _set_status_from_check(self, charm_function):
+        """Set the unit status according to the workload health check.
+
+        Args:
+            charm_function: The function the charm is configured to provide.
+        """
+        if charm_function == "usersync":
+            self.unit.status = ActiveStatus("Status check: UP")
             return
 
-        container = self.unit.get_container(self.name)
+        container = self._container
 
         check = container.get_check("up")
         if check.status != CheckStatus.UP:
@@ -209,7 +270,7 @@ class RangerK8SCharm(TypedCharmBase[CharmConfig]):
         Args:
             event:The event triggered by the restart action
         """
-        container = self.unit.get_container(self.name)
+        container = self._container
         if not container.can_connect():
             event.defer()
             return
@@ -219,17 +280,32 @@ class RangerK8SCharm(TypedCharmBase[CharmConfig]):
         event.set_results({"result": "ranger successfully restarted"})
         self.unit.status = ActiveStatus()
 
+    def get_java_home(self, container):
+        """Return the workload's JAVA_HOME, looked up once per hook.
+
+        Args:
+            container: The application container.
+
+        Returns:
+            The JAVA_HOME path in the container.
+        """
+        if self._java_home is None:
+            out, _ = container.exec(
+                ["/bin/sh", "-c", "echo $JAVA_HOME"]
+            ).wait_output()
+            self._java_home = out.strip()
+        return self._java_home
+
     def set_truststore_password(self, container):
         """Update the truststore password to the randomly generated one.
 
         Args:
             container: The application container.
-        """
-        out, _ = container.exec(
-            ["/bin/sh", "-c", "echo $JAVA_HOME"]
-        ).wait_output()
-        java_home = out.strip()
 
+        Returns:
+            True if the truststore uses the generated password.
+        """
+        java_home = self.get_java_home(container)
         command = [
             "keytool",
             "-storepass",
@@ -244,34 +320,28 @@ class RangerK8SCharm(TypedCharmBase[CharmConfig]):
             container.exec(command).wait_output()
         except (subprocess.CalledProcessError, ExecError) as e:
             if e.stderr and "password was incorrect" in e.stderr:
-                return
+                return True
             if e.stderr and "Warning" in e.stderr:
-                return
-            logger.debug(f"Unable to update truststore password {e.stderr}")
-
-    def _configure_ranger_admin(self, container):
-        """Prepare Ranger Admin install.properties file.
+                return True
+            logger.debug("Unable to update truststore password %s", e.stderr)
+            return False
+        return True
 
-        Args:
-            container: The application container.
+    def _ranger_admin_context(self):
+        """Build the Ranger Admin environment variables.
 
         Returns:
-            ADMIN_ENTRYPOINT: Entrypoint path for Ranger Admin startup.
             context: Environment variables for pebble plan.
         """
+        config = self.config
         db_conn = self._state.database_connection
-        if self.unit.is_leader():
-            self._state.truststore_pwd = (
-                self._state.truststore_pwd or generate_password()
-            )
-        self.set_truststore_password(container)
+        truststore_pwd = self._state.truststore_pwd
+        if self.unit.is_leader() and not truststore_pwd:
+            truststore_pwd = generate_password()
+            self._state.truststore_pwd = truststore_pwd
         opensearch = self._state.opensearch or {}
-        if opensearch.get("is_enabled") and not container.exists(
-            "/opensearch.crt"
-        ):
-            self.opensearch_relation_handler.update_certificates()
 
-        context = {
+        return {
             "DB_NAME": db_conn["dbname"],
             "DB_HOST": db_conn["host"],
             "DB_PORT": db_conn["port"],
@@ -283,51 +353,70 @@ class RangerK8SCharm(TypedCharmBase[CharmConfig]):
             "OPENSEARCH_PWD": opensearch.get("password"),
             "OPENSEARCH_USER": opensearch.get("username"),
             "OPENSEARCH_ENABLED": opensearch.get("is_enabled"),
-            "RANGER_ADMIN_PWD": self.config["ranger-admin-password"],
-            "JAVA_OPTS": f"-Duser.timezone=UTC0 -Djavax.net.ssl.trustStorePassword={self._state.truststore_pwd}",
-            "RANGER_USERSYNC_PWD": self.config["ranger-usersync-password"],
+            "RANGER_ADMIN_PWD": config["ranger-admin-password"],
+            "JAVA_OPTS": f"-Duser.timezone=UTC0 -Djavax.net.ssl.trustStorePassword={truststore_pwd}",
+            "RANGER_USERSYNC_PWD": config["ranger-usersync-password"],
         }
-        config = render("admin-config.jinja", context)
-        container.push(
-            "/usr/lib/ranger/admin/install.properties", config, make_dirs=True
-        )
-        return ADMIN_ENTRYPOINT, context
 
-    def _configure_ranger_usersync(self, container):
-        """Prepare Ranger Usersync install.properties file.
+    def _configure_ranger_admin(self, container, context):
+        """Prepare Ranger Admin install.properties file.
 
         Args:
             container: The application container.
+            context: Environment variables for pebble plan.
+
+        Returns:
+            True if the truststore was updated successfully.
+        """
+        configured = self.set_truststore_password(container)
+        if context["OPENSEARCH_ENABLED"] and not container.exists(
+            "/opensearch.crt"
+        ):
+            handler = self.opensearch_relation_handler
+            configured = handler.update_certificates() and configured
+
+        config = render(ADMIN_TEMPLATE, context)
+        push_if_changed(
+            container, "/usr/lib/ranger/admin/install.properties", config
+        )
+        return configured
+
+    def _ranger_usersync_context(self):
+        """Build the Ranger Usersync environment variables.
 
         Returns:
-            USERSYNC_ENTRYPOINT: Entrypoint path for Ranger Usersync startup.
             context: Environment variables for pebble plan.
         """
-        context = {}
+        config = self.config
         ldap = self._state.ldap or {}
-        for key, value in vars(self.config).items():
-            if not key.startswith("sync"):
-                continue
+        values = vars(config)
+        context = {
+            env_key: values[key] for key, env_key in _SYNC_KEY_MAP.items()
+        }
+        # Values provided by the LDAP relation take precedence over config.
+        for key in RELATION_VALUES:
+            if ldap.get(key):
+                context[_SYNC_KEY_MAP[key]] = ldap[key]
 
-            if key in RELATION_VALUES:
-                value = ldap.get(key) or self.config[key]
+        context["POLICY_MGR_URL"] = config["policy-mgr-url"]
+        context["RANGER_USERSYNC_PWD"] = config["ranger-usersync-password"]
+        return context
 
-            updated_key = key.upper()
-            context[updated_key] = value
+    def _configure_ranger_usersync(self, container, context):
+        """Prepare Ranger Usersync install.properties file.
 
-        context.update(
-            {
-                "POLICY_MGR_URL": self.config["policy-mgr-url"],
-                "RANGER_USERSYNC_PWD": self.config["ranger-usersync-password"],
-            }
-        )
-        config = render("ranger-usersync-config.jinja", context)
-        container.push(
-            "/usr/lib/ranger/usersync/install.properties",
-            config,
-            make_dirs=True,
+        Args:
+            container: The application container.
+            context: Environment variables for pebble plan.
+
+        Returns:
+            True, as usersync has no truststore to update.
+        """
+        config = render(USERSYNC_TEMPLATE, context)
+        push_if_changed(
+            container, "/usr/lib/ranger/usersync/install.properties", config
         )
-        return USERSYNC_ENTRYPOINT, context
+        return True
 
     def _validate_password(self, password, config_key, state_key):
         """Validate that the admin and usersync passwords are not changed after deployment.
@@ -351,12 +440,33 @@ class RangerK8SCharm(TypedCharmBase[CharmConfig]):
             logger.error(message)
             raise ValueError(message)
 
+    def _validation_fingerprint(self):
+        """Capture the inputs of `validate`.
+
+        Leadership is included as only the leader records the passwords.
+
+        Returns:
+            A digest of the config, the peer relation data and leadership.
+        """
+        relation = self._peer_relation
+        state = relation and dict(relation.data[self.app])
+        inputs = [dict(self.model.config), state, self.unit.is_leader()]
+        content = json.dumps(inputs, sort_keys=True).encode()
+        return hashlib.blake2b(content, digest_size=16).hexdigest()
+
     def validate(self):
         """Validate that configuration and relations are valid and ready.
 
+        A successful result is remembered across hooks, so that updates with
+        unchanged config and state are not validated again.
+
         Raises:
             ValueError: in case of invalid configuration.
         """
+        fingerprint = self._validation_fingerprint()
+        if fingerprint == self._stored.validated_digest:
+            return
+
         if not self._state.is_ready():
             raise ValueError("peer relation not ready")
 
@@ -383,6 +493,7 @@ class RangerK8SCharm(TypedCharmBase[CharmConfig]):
             "ranger-usersync-password",
             "ranger_usersync_password",
         )
+        self._stored.validated_digest = self._validation_fingerprint()
 
     def update(self, event):
         """Update the Ranger server configuration and re-plan its execution.
@@ -396,52 +507,73 @@ class RangerK8SCharm(TypedCharmBase[CharmConfig]):
             self.unit.status = BlockedStatus(str(err))
             return
 
-        container = self.unit.get_container(self.name)
+        container = self._container
         if not container.can_connect():
             event.defer()
             return
 
         charm_function = self.config["charm-function"].value
-        logger.info("configuring ranger %s", charm_function)
+        functions = {
+            "admin": (
+                ADMIN_ENTRYPOINT,
+                ADMIN_TEMPLATE,
+                self._ranger_admin_context,
+                self._configure_ranger_admin,
+            ),
+            "usersync": (
+                USERSYNC_ENTRYPOINT,
+                USERSYNC_TEMPLATE,
+                self._ranger_usersync_context,
+                self._configure_ranger_usersync,
+            ),
+        }
+        if charm_function not in functions:
+            self.unit.status = BlockedStatus("Missing charm-function.")
+            return
 
-        self.model.unit.close_port(port=APPLICATION_PORT, protocol="tcp")
+        command, template, build_context, configure = functions[charm_function]
+        logger.info("configuring ranger %s", charm_function)
 
-        if charm_function == "usersync":
-            command, context = self._configure_ranger_usersync(container)
-        elif charm_function == "admin":
-            self.model.unit.open_port(port=APPLICATION_PORT, protocol="tcp")
-            command, context = self._configure_ranger_admin(container)
+        # Only opens or closes ports which differ from the current state.
+        if charm_function == "admin":
+            self.unit.set_ports(APPLICATION_PORT)
         else:
-            self.unit.status = BlockedStatus("Missing charm-function.")
-            return
+            self.unit.set_ports()
 
-        logger.info("planning ranger %s execution", charm_function)
+        context = build_context()
         pebble_layer = {
             "summary": f"ranger {charm_function} layer",
             "services": {
                 self.name: {
+                    **self._SERVICE_TEMPLATE,
                     "summary": f"ranger {charm_function}",
                     "command": command,
-                    "startup": "enabled",
-                    "override": "replace",
                     "environment": context,
                 }
             },
         }
         if charm_function == "admin":
-            pebble_layer.update(
-                {
-                    "checks": {
-                        "up": {
-                            "override": "replace",
-                            "period": "10s",
-                            "http": {"url": "http://localhost:6080/"},
-                        }
-                    }
-                },
-            )
+            pebble_layer["checks"] = self._ADMIN_CHECKS
+
+        # The layer holds the context as its environment, so its digest also
+        # covers the command and checks handed to Pebble.
+        digest = config_digest(template, pebble_layer)
+        if (
+            digest == self._stored.applied_digest
+            and self.name in container.get_plan().services
+        ):
+            logger.info("ranger %s configuration unchanged", charm_function)
+            self._set_status_from_check(charm_function)
+            return
+
+        configured = configure(container, context)
+
+        logger.info("planning ranger %s execution", charm_function)
         container.add_layer(self.name, pebble_layer, combine=True)
         container.replan()
+        # A failed truststore update is only logged, so the digest is not
+        # recorded and the next update runs it again.
+        self._stored.applied_digest = digest if configured else None
 
         self.unit.status = MaintenanceStatus("replanning application")
 
@@ -6,12 +6,8 @@
 APPLICATION_PORT = 6080
 LOCALHOST_URL = "http://localhost"
 ADMIN_USER = "admin"
-HEADERS = {
-    "Accept": "application/json",
-    "Content-Type": "application/json",
-}
-SYSTEM_GROUPS = ["public"]
-EXPECTED_KEYS = ["users", "groups", "memberships"]
+SYSTEM_GROUPS = frozenset({"public"})
+EXPECTED_KEYS = frozenset({"users", "groups", "memberships"})
 MEMBER_TYPE_MAPPING = {
     "user": "vXUsers",
     "group": "vXGroups",
@@ -25,24 +21,25 @@ ENDPOINT_MAPPING = {
 APP_NAME = "ranger-k8s"
 ADMIN_ENTRYPOINT = "/home/ranger/scripts/ranger-admin-entrypoint.sh"
 USERSYNC_ENTRYPOINT = "/home/ranger/scripts/ranger-usersync-entrypoint.sh"
-RELATION_VALUES = [
-    "sync_ldap_bind_dn",
-    "sync_ldap_bind_password",
-    "sync_ldap_search_base",
-    "sync_ldap_user_search_base",
-    "sync_group_search_base",
-    "sync_ldap_url",
-]
+ADMIN_TEMPLATE = "admin-config.jinja"
+USERSYNC_TEMPLATE = "ranger-usersync-config.jinja"
+RELATION_VALUES = frozenset(
+    {
+        "sync_ldap_bind_dn",
+        "sync_ldap_bind_password",
+        "sync_ldap_search_base",
+        "sync_ldap_user_search_base",
+        "sync_group_search_base",
+        "sync_ldap_url",
+    }
+)
 
 # Observability literals
 METRICS_PORT = 6080
 LOG_FILES = ["/usr/lib/ranger/admin/ews/logs/ranger-admin-ranger-k8s-0-.log"]
 
-HEADERS = {
-    "Content-Type": "application/json",
-}
-
 # OpenSearch literals
+HEADERS = {"Content-Type": "application/json"}
 INDEX_NAME = "ranger_audits"
 CERTIFICATE_NAME = "opensearch-ca"
 OPENSEARCH_SCHEMA = {
@@ -87,14 +84,17 @@ OPENSEARCH_SCHEMA = {
         "policyVersion": {"type": "long"},
     }
 }
-DEFAULT_POLICIES = [
-    "all - trinouser",
-    "all - catalog",
-    "all - function",
-    "all - catalog, sessionproperty",
-    "all - catalog, schema, procedure",
-    "all - catalog, schema, table",
-    "all - systemproperty",
-    "all - catalog, schema, table, column",
-    "all - catalog, schema",
-]
+POLICY_PAGE_SIZE = 50
+DEFAULT_POLICIES = frozenset(
+    {
+        "all - trinouser",
+        "all - catalog",
+        "all - function",
+        "all - catalog, sessionproperty",
+        "all - catalog, schema, procedure",
+        "all - catalog, schema, table",
+        "all - systemproperty",
+        "all - catalog, schema, table, column",
+        "all - catalog, schema",
+    }
+)
@@ -70,7 +70,7 @@ class LDAPRelationHandler(framework.Object):
         if self.charm.config["charm-function"].value != "usersync":
             return
 
-        container = self.charm.model.unit.get_container(self.charm.name)
+        container = self.charm._container
         if not container.can_connect():
             event.defer()
             return
@@ -101,7 +101,7 @@ class LDAPRelationHandler(framework.Object):
         if self.charm.config["charm-function"].value != "usersync":
             return
 
-        container = self.charm.model.unit.get_container(self.charm.name)
+        container = self.charm._container
         if not container.can_connect():
             event.defer()
             return
@@ -115,10 +115,9 @@ class LDAPRelationHandler(framework.Object):
         Raises:
             ValueError: if ldap parameters are not available.
         """
-        config = vars(self.charm.config)
-        if not self.charm._state.ldap:
-            for value in RELATION_VALUES:
-                if not config.get(value):
-                    raise ValueError(
-                        "Add an LDAP relation or update config values."
-                    )
+        if self.charm._state.ldap:
+            return
+
+        config = self.charm.config
+        if not all(getattr(config, value) for value in RELATION_VALUES):
+            raise ValueError("Add an LDAP relation or update config values.")
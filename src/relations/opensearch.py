@@ -3,21 +3,26 @@
 
 """Defines opensearch relation event handling methods."""
 
+import json
 import logging
 import re
+import shlex
 
-import requests
 from charms.data_platform_libs.v0.data_interfaces import IndexCreatedEvent
 from ops import framework
 from ops.model import WaitingStatus
 from ops.pebble import ExecError
-from requests.auth import HTTPBasicAuth
 
 from literals import CERTIFICATE_NAME, HEADERS, INDEX_NAME, OPENSEARCH_SCHEMA
-from utils import log_event_handler
+from utils import log_event_handler, parse_endpoint, requires_ready_leader
 
 logger = logging.getLogger(__name__)
 
+SCHEMA_BODY = json.dumps(OPENSEARCH_SCHEMA).encode()
+CERTIFICATE_PATTERN = re.compile(
+    r"-----BEGIN CERTIFICATE-----.*?-----END CERTIFICATE-----", re.DOTALL
+)
+
 
 class OpensearchRelationHandler(framework.Object):
     """Client for ranger:postgresql relations."""
@@ -43,19 +48,13 @@ class OpensearchRelationHandler(framework.Object):
         )
 
     @log_event_handler(logger)
+    @requires_ready_leader
     def _on_index_created(self, event: IndexCreatedEvent) -> None:
         """Handle opensearch relation changed events.
 
         Args:
             event: The event triggered when the relation changed.
         """
-        if not self.charm._state.is_ready():
-            event.defer()
-            return
-
-        if not self.charm.unit.is_leader():
-            return
-
         self.charm.unit.status = WaitingStatus(
             f"handling {self.relation_name} change"
         )
@@ -74,31 +73,43 @@ class OpensearchRelationHandler(framework.Object):
         if self.charm.unit.is_leader():
             self.update(event, True)
 
-    def update_certificates(self, relation_broken=False) -> None:
+    def update_certificates(self, relation_broken=False) -> bool:
         """Add/remove the Opensearch certificate in the Java truststore.
 
         Args:
             relation_broken: If the event is a relation broken event.
+
+        Returns:
+            True if the truststore was updated successfully.
         """
-        container = self.charm.unit.get_container(self.charm.name)
+        container = self.charm._container
         if not container.can_connect():
-            logger.debug(f"Unable to connect to {self.charm.name} container.")
-            return
+            logger.debug("Unable to connect to %s container.", self.charm.name)
+            return False
 
         certificate = self.charm._state.opensearch_certificate
         truststore_pwd = self.charm._state.truststore_pwd
-        out, _ = container.exec(
-            ["/bin/sh", "-c", "echo $JAVA_HOME"]
-        ).wait_output()
-        java_home = out.strip()
-
-        if not relation_broken and certificate:
+        java_home = self.charm.get_java_home(container)
+
+        keystore = f"{java_home}/lib/security/cacerts"
+        delete_command = [
+            "keytool",
+            "-delete",
+            "-keystore",
+            keystore,
+            "-alias",
+            CERTIFICATE_NAME,
+            "-storepass",
+            truststore_pwd,
+        ]
+        import_certificate = not relation_broken and certificate
+        if import_certificate:
             container.push("/opensearch.crt", certificate)
-            command = [
+            import_command = [
                 "keytool",
                 "-importcert",
                 "-keystore",
-                f"{java_home}/lib/security/cacerts",
+                keystore,
                 "-file",
                 "/opensearch.crt",
                 "-alias",
@@ -107,23 +118,33 @@ class OpensearchRelationHandler(framework.Object):
                 truststore_pwd,
                 "--no-prompt",
             ]
-        else:
+            # Replace any previous certificate within a single Pebble exec.
+            # This starts keytool twice, but a missing alias is the only
+            # delete failure which is ignored.
             command = [
-                "keytool",
-                "-delete",
-                "-keystore",
-                f"{java_home}/lib/security/cacerts",
-                "-alias",
-                CERTIFICATE_NAME,
-                "-storepass",
-                truststore_pwd,
+                "/bin/sh",
+                "-c",
+                f"out=$({shlex.join(delete_command)} 2>&1) || "
+                'case "$out" in *"does not exist"*) ;; '
+                '*) echo "$out"; exit 1 ;; esac; '
+                f"{shlex.join(import_command)}",
             ]
+        else:
+            command = delete_command
         try:
-            container.exec(command).wait()
+            container.exec(command).wait_output()
         except ExecError as e:
-            if e.stdout and "already exists" in e.stdout:
-                return
-            logger.error(e.stdout)
+            logger.error(
+                "Unable to update the OpenSearch certificate: %s %s",
+                e.stdout,
+                e.stderr,
+            )
+            # The certificate file marks a completed import, so it is
+            # removed for the next update to import it again.
+            if import_certificate:
+                container.remove_path("/opensearch.crt")
+            return False
+        return True
 
     def get_secret_content(self, secret_id) -> dict:
         """Get the content of a juju secret by id.
@@ -148,9 +169,14 @@ class OpensearchRelationHandler(framework.Object):
         secret_id = event_data.get("secret-tls")
         content = self.get_secret_content(secret_id)
         tls_ca = content["tls-ca"]
-        pattern = r"-----BEGIN CERTIFICATE-----.*?-----END CERTIFICATE-----"
-        certificates_list = re.findall(pattern, tls_ca, re.DOTALL)
-        self.charm._state.opensearch_certificate = certificates_list[1]
+        certificates_list = CERTIFICATE_PATTERN.findall(tls_ca)
+        if not certificates_list:
+            logger.warning("No certificate found in the OpenSearch TLS CA.")
+            return
+
+        # The CA follows the server certificate, unless it is sent alone.
+        index = 1 if len(certificates_list) > 1 else 0
+        self.charm._state.opensearch_certificate = certificates_list[index]
 
     def get_conn_values(self, event) -> dict:
         """Get the connection values from the relation to Opensearch.
@@ -165,7 +191,7 @@ class OpensearchRelationHandler(framework.Object):
         secret_id = event_data.get("secret-user")
         user_credentials = self.get_secret_content(secret_id)
 
-        host, port = event_data.get("endpoints").split(",", 1)[0].split(":")
+        host, port = parse_endpoint(event_data.get("endpoints"))
         return {
             "index": INDEX_NAME,
             "host": host,
@@ -184,19 +210,26 @@ class OpensearchRelationHandler(framework.Object):
         Raises:
             e: The error produced by an unsuccessful request.
         """
+        # `requests` is costly to load and only needed once the index is
+        # created, so it is not imported on every hook.
+        # pylint: disable=import-outside-toplevel
+        import requests
+        from requests.auth import HTTPBasicAuth
+
         url = f"https://{env['host']}:{env['port']}/{env['index']}/_mapping"
         try:
             requests.put(
                 url,
                 auth=HTTPBasicAuth(env["username"], env["password"]),
                 headers=HEADERS,
-                json=OPENSEARCH_SCHEMA,
+                data=SCHEMA_BODY,
                 verify=False,
                 timeout=60,
             )  # nosec
         except requests.exceptions.RequestException as e:
             logger.error(
-                f"An exception has occurred while adding the audit schema: {e}"
+                "An exception has occurred while adding the audit schema: %s",
+                e,
             )
             raise
 
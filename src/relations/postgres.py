@@ -9,7 +9,7 @@ from charms.data_platform_libs.v0.data_interfaces import DatabaseCreatedEvent
 from ops import framework
 from ops.model import WaitingStatus
 
-from utils import log_event_handler
+from utils import log_event_handler, parse_endpoint, requires_ready_leader
 
 logger = logging.getLogger(__name__)
 
@@ -47,25 +47,20 @@ class PostgresRelationHandler(framework.Object):
         )
 
     @log_event_handler(logger)
+    @requires_ready_leader
     def _on_database_changed(self, event: DatabaseCreatedEvent) -> None:
         """Handle database creation/change events.
 
         Args:
             event: The event triggered when the relation changed.
         """
-        if not self.charm._state.is_ready():
-            event.defer()
-            return
-
-        if not self.charm.unit.is_leader():
-            return
-
         self.charm.unit.status = WaitingStatus(
             f"handling {event.relation.name} change"
         )
         self.update(event)
 
     @log_event_handler(logger)
+    @requires_ready_leader
     def _on_database_relation_broken(
         self, event: DatabaseCreatedEvent
     ) -> None:
@@ -74,12 +69,7 @@ class PostgresRelationHandler(framework.Object):
         Args:
             event: The event triggered when the relation changed.
         """
-        if not self.charm._state.is_ready():
-            event.defer()
-            return
-
-        if self.charm.unit.is_leader():
-            self.update(event, True)
+        self.update(event, True)
 
     def update(self, event, relation_broken=False):
         """Assign nested value in peer relation.
@@ -90,7 +80,7 @@ class PostgresRelationHandler(framework.Object):
         """
         db_conn = None
         if not relation_broken:
-            host, port = event.endpoints.split(",", 1)[0].split(":")
+            host, port = parse_endpoint(event.endpoints)
             db_conn = {
                 "dbname": PostgresRelationHandler.DB_NAME,
                 "host": host,
@@ -99,7 +89,9 @@ class PostgresRelationHandler(framework.Object):
                 "user": event.username,
             }
 
-        self.charm._state.database_connection = db_conn
+        # Juju ignores unchanged settings, this only saves a relation-set.
+        if self.charm._state.database_connection != db_conn:
+            self.charm._state.database_connection = db_conn
         self.charm.update(event)
 
     def validate(self):
@@ -4,13 +4,14 @@
 """Ranger client relation hooks & helpers."""
 
 
+import hashlib
+import json
 import logging
 
-from apache_ranger.client import ranger_client
 from apache_ranger.exceptions import RangerServiceException
 from apache_ranger.model import ranger_service
 from ops.charm import CharmBase
-from ops.framework import Object
+from ops.framework import Object, StoredState
 from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus
 
 from literals import (
@@ -18,11 +19,15 @@ from literals import (
     APPLICATION_PORT,
     DEFAULT_POLICIES,
     LOCALHOST_URL,
+    POLICY_PAGE_SIZE,
 )
 from utils import log_event_handler
 
 logger = logging.getLogger(__name__)
 
+# Relation data keys describing the service itself rather than its configs.
+SERVICE_FIELDS = frozenset({"name", "type"})
+
 
 class RangerProvider(Object):
     """Defines functionality for the 'provides' side of the 'ranger-client' relation.
@@ -32,6 +37,8 @@ class RangerProvider(Object):
         - relation-broken
     """
 
+    _stored = StoredState()
+
     def __init__(
         self, charm: CharmBase, relation_name: str = "policy"
     ) -> None:
@@ -54,6 +61,11 @@ class RangerProvider(Object):
         )
 
         self.charm = charm
+        # Digests are kept by the leader only, so that recording them does
+        # not change the peer databag observed by the other units.
+        self._stored.set_default(policy_digests={})
+        self._ranger = None
+        self._ranger_password = None
 
     @log_event_handler(logger)
     def _on_relation_changed(self, event):
@@ -72,40 +84,70 @@ class RangerProvider(Object):
         if not data:
             return
 
+        # Parsing the typed config validates every option, so it is read once.
+        config = self.charm.config
+
+        key = f"relation_{event.relation.id}"
+        digest = self._relation_digest(data, config["policy-mgr-url"])
+        if self._stored.policy_digests.get(key) == digest:
+            logger.debug("policy relation %s unchanged", event.relation.id)
+            return
+
+        if self._add_ranger_service(event, data, config):
+            self._stored.policy_digests[key] = digest
+
+    def _add_ranger_service(self, event, data, config):
+        """Create the Ranger service of a policy relation and share its url.
+
+        Args:
+            event: relation changed event.
+            data: relation data
+            config: the typed charm config
+
+        Returns:
+            True if the service exists in Ranger, False otherwise.
+        """
+        policy_manager_url = config["policy-mgr-url"]
         self.charm.unit.status = MaintenanceStatus("Adding policy relation")
 
         logger.info("creating service")
         try:
-            ranger = self._create_ranger_client()
+            ranger = self._create_ranger_client(
+                config["ranger-admin-password"]
+            )
             service, is_created = self._create_ranger_service(
-                ranger, data, event
+                ranger, data, event, config["lookup-timeout"]
             )
         except RangerServiceException:
+            self._ranger = None
             event.defer()
             logger.exception(
                 "A Ranger Service Exception has occurred while attempting to create a service:"
             )
-            return
+            return False
         except Exception:
             self.charm.unit.status = BlockedStatus("Unable to create service")
             logger.exception(
                 "An error occurred while creating the ranger service:"
             )
-            return
+            return False
 
         if not service:
             logger.debug("Unable to create service, deferring event.")
             event.defer()
+            self._set_policy_manager(event, policy_manager_url)
+            return False
 
         if not is_created:
-            self._set_policy_manager(event)
-            return
+            self._set_policy_manager(event, policy_manager_url)
+            return True
 
         services = self.charm._state.services or {}
         services[f"relation_{event.relation.id}"] = service.id
         self.charm._state.services = services
-        self._set_policy_manager(event)
+        self._set_policy_manager(event, policy_manager_url)
         self.charm.unit.status = ActiveStatus()
+        return True
 
     @log_event_handler(logger)
     def _on_relation_broken(self, event):
@@ -117,15 +159,21 @@ class RangerProvider(Object):
         if not self.charm.unit.is_leader():
             return
 
-        if f"relation_{event.relation.id}" not in self.charm._state.services:
+        key = f"relation_{event.relation.id}"
+        self._stored.policy_digests.pop(key, None)
+
+        services = self.charm._state.services or {}
+        if key not in services:
             return
 
         try:
-            service_id = self.charm._state.services[
-                f"relation_{event.relation.id}"
-            ]
-            self._delete_ranger_service(service_id, event.relation.id)
+            self._delete_ranger_service(
+                services[key],
+                event.relation.id,
+                self.charm.config["ranger-admin-password"],
+            )
         except RangerServiceException:
+            self._ranger = None
             logger.exception(
                 "A Ranger Service Exception has occurred while attempting to delete a service:"
             )
@@ -137,17 +185,37 @@ class RangerProvider(Object):
             )
             return
 
-        existing_services = self.charm._state.services
-        del existing_services[f"relation_{event.relation.id}"]
-        self.charm._state.services = existing_services
+        del services[key]
+        self.charm._state.services = services
+
+    def _relation_digest(self, data, policy_manager_url):
+        """Compute a digest of what a policy relation is configured from.
+
+        The database connection is part of the digest, as services must be
+        created again once Ranger is backed by another database.
+
+        Args:
+            data: relation data
+            policy_manager_url: the policy manager url shared with the relation
+
+        Returns:
+            A hex digest of the relation data, the policy manager url and
+            the database connection.
+        """
+        content = dict(data)
+        content["policy_manager_url"] = policy_manager_url
+        content["database_connection"] = self.charm._state.database_connection
+        encoded = json.dumps(content, sort_keys=True).encode()
+        return hashlib.blake2b(encoded, digest_size=16).hexdigest()
 
-    def _create_ranger_service(self, ranger, data, event):
+    def _create_ranger_service(self, ranger, data, event, lookup_timeout):
         """Create application service in Ranger.
 
         Args:
             ranger: ranger client
             data: relation data
             event: relation event
+            lookup_timeout: resource lookup timeout, in milliseconds
 
         Returns:
             service: the object for the created service
@@ -158,7 +226,7 @@ class RangerProvider(Object):
         existing_service = ranger.get_service(service_name)
         if existing_service is not None:
             logger.info(
-                f"Service {service_name!r} not created as it already exists."
+                "Service %r not created as it already exists.", service_name
             )
             is_created = False
             return (existing_service, is_created)
@@ -168,28 +236,31 @@ class RangerProvider(Object):
         )
         service.configs = {
             "username": f"relation_id_{event.relation.id}",
-            "resource.lookup.timeout.value.in.ms": self.charm.config[
-                "lookup-timeout"
-            ],
+            "resource.lookup.timeout.value.in.ms": lookup_timeout,
+            **{
+                key: value
+                for key, value in data.items()
+                if key not in SERVICE_FIELDS
+            },
         }
-        for key, value in data.items():
-            if key not in ["name", "type"]:
-                service.configs[key] = value
-
-        created_service = ranger.create_service(service)
 
-        if not ranger.get_service(service_name):
+        # The client returns None instead of raising when Ranger is
+        # unavailable, so the service is read back to confirm its creation.
+        ranger.create_service(service)
+        created_service = ranger.get_service(service_name)
+        if created_service is None:
             is_created = False
             return (None, is_created)
 
         is_created = True
         return (created_service, is_created)
 
-    def _set_policy_manager(self, event):
+    def _set_policy_manager(self, event, policy_manager_url):
         """Set the policy manager url in the relation databag.
 
         Args:
             event: relation event
+            policy_manager_url: the policy manager url
         """
         relation = self.charm.model.get_relation(
             self.relation_name, event.relation.id
@@ -198,29 +269,61 @@ class RangerProvider(Object):
         if relation:
             relation.data[self.charm.app].update(
                 {
-                    "policy_manager_url": self.charm.config["policy-mgr-url"],
+                    "policy_manager_url": policy_manager_url,
                 }
             )
 
-    def _create_ranger_client(self):
+    def _create_ranger_client(self, password):
         """Prepare Ranger client.
 
+        The client is reused for as long as the admin password is unchanged,
+        so that deferred events re-emitted in the same hook share its session.
+
+        Args:
+            password: the Ranger admin password
+
         Returns:
             ranger: ranger client
         """
-        ranger_auth = (ADMIN_USER, self.charm.config["ranger-admin-password"])
+        if self._ranger is not None and self._ranger_password == password:
+            return self._ranger
+
+        # The client pulls in `requests`, which is costly to load and only
+        # needed for policy relation events, so it is not imported on every hook.
+        # pylint: disable=import-outside-toplevel
+        from apache_ranger.client import ranger_client
+        from requests.adapters import HTTPAdapter
+        from urllib3.util import Retry
+
         ranger_url = f"{LOCALHOST_URL}:{APPLICATION_PORT}"
-        ranger = ranger_client.RangerClient(ranger_url, ranger_auth)
-        return ranger
+        self._ranger = ranger_client.RangerClient(
+            ranger_url, (ADMIN_USER, password)
+        )
+        # Retry transient gateway errors and refused connections, which are
+        # common while Ranger restarts; non-idempotent calls are not retried.
+        # The last response is returned to the client, which raises
+        # RangerServiceException for 502 and 504 but returns None for 503.
+        retries = Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False,
+        )
+        self._ranger.session.mount(
+            "http://", HTTPAdapter(pool_maxsize=4, max_retries=retries)
+        )
+        self._ranger_password = password
+        return self._ranger
 
-    def _delete_ranger_service(self, service_id, relation_id):
+    def _delete_ranger_service(self, service_id, relation_id, password):
         """Delete service in Ranger.
 
         Args:
             service_id: the ID of the service to delete
             relation_id: the id of the relation
+            password: the Ranger admin password
         """
-        ranger = self._create_ranger_client()
+        ranger = self._create_ranger_client(password)
         retrieved_service = ranger.get_service_by_id(service_id)
 
         if retrieved_service is None:
@@ -230,7 +333,8 @@ class RangerProvider(Object):
             ranger, retrieved_service.name, relation_id
         ):
             logger.warning(
-                f"Service {retrieved_service.name} has non-default policies defined. Deletion aborted."
+                "Service %s has non-default policies defined. Deletion aborted.",
+                retrieved_service.name,
             )
             return
         ranger.delete_service_by_id(service_id)
@@ -246,13 +350,58 @@ class RangerProvider(Object):
         Returns:
             bool: if the service contains custom policies
         """
-        policies = ranger.get_policies_in_service(service_name)
+        policies = self._iter_policies(ranger, service_name)
+        relation_user = f"relation_id_{relation_id}"
+
+        return any(
+            policy["name"] not in DEFAULT_POLICIES
+            or any(
+                relation_user not in item["users"]
+                for item in policy["policyItems"]
+            )
+            for policy in policies
+        )
+
+    def _iter_policies(self, ranger, service_name):
+        """Iterate over the policies of a service, one page at a time.
+
+        Pages are only fetched as they are consumed, so callers looking for
+        a single match stop querying Ranger once they find it.
 
-        for policy in policies:
-            if policy["name"] not in DEFAULT_POLICIES:
-                return True
+        Args:
+            ranger: ranger client
+            service_name: the name of the ranger service
 
-            for item in policy["policyItems"]:
-                if f"relation_id_{relation_id}" not in item["users"]:
-                    return True
-        return False
+        Yields:
+            policy: the policies of the service.
+
+        Raises:
+            ValueError: if a page of policies could not be read.
+        """
+        start_index = 0
+        first = None
+        while True:
+            page = ranger.get_policies_in_service(
+                service_name,
+                params={
+                    "startIndex": start_index,
+                    "pageSize": POLICY_PAGE_SIZE,
+                },
+            )
+            # The client returns None instead of raising when Ranger is
+            # unavailable, which must not be mistaken for the last page.
+            if page is None:
+                raise ValueError(
+                    f"Unable to read the policies of service {service_name}"
+                )
+
+            # Stop if the server ignored the paging parameters and sent the
+            # same policies again.
+            if not page or (start_index and page[0] == first):
+                return
+
+            first = page[0]
+            yield from page
+            if len(page) != POLICY_PAGE_SIZE:
+                return
+            start_index += POLICY_PAGE_SIZE
@@ -13,6 +13,11 @@ from pydantic import validator
 
 logger = logging.getLogger(__name__)
 
+LDAP_URL_PATTERN = re.compile(r"^ldaps?://.*:\d+$")
+PASSWORD_PATTERN = re.compile(
+    r"^(?=.*[A-Za-z])(?=.*\d)(?=.*[\W_])[A-Za-z\d\W_]{8,}$"
+)
+
 
 class BaseEnumStr(str, Enum):
     """Base class for string enum."""
@@ -110,8 +115,7 @@ class CharmConfig(BaseConfigModel):
         Raises:
             ValueError: in the case when the value incorrectly formatted.
         """
-        ldap_url_pattern = r"^ldaps?://.*:\d+$"
-        if re.match(ldap_url_pattern, value) is not None:
+        if LDAP_URL_PATTERN.match(value) is not None:
             return value
         raise ValueError("Value incorrectly formatted.")
 
@@ -152,9 +156,6 @@ class CharmConfig(BaseConfigModel):
         Raises:
             ValueError: If the password does not meet the requirements.
         """
-        pattern = re.compile(
-            r"^(?=.*[A-Za-z])(?=.*\d)(?=.*[\W_])[A-Za-z\d\W_]{8,}$"
-        )
-        if pattern.match(value):
+        if PASSWORD_PATTERN.match(value):
             return value
         raise ValueError("Password does not match requirements.")
@@ -4,14 +4,47 @@
 """Define helpers methods."""
 
 import functools
+import hashlib
+import json
 import logging
 import os
 import secrets
 import string
 import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
 from apache_ranger.exceptions import RangerServiceException
-from jinja2 import Environment, FileSystemLoader
+from ops.pebble import PathError
+
+PASSWORD_ALPHABET = string.ascii_letters + string.digits
+TEMPLATES_DIR = os.path.join(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)),
+    "templates",
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _environment():
+    """Create the Jinja environment used to render templates.
+
+    Jinja is only loaded when a template needs rendering, as most hooks do
+    not render anything. Templates only change on charm upgrade, which starts
+    a new process, so compiled templates are cached without checking for
+    modifications.
+
+    Returns:
+        The Jinja environment.
+    """
+    # pylint: disable=import-outside-toplevel
+    from jinja2 import Environment, FileSystemLoader
+
+    return Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        autoescape=True,
+        auto_reload=False,
+        cache_size=64,
+    )
 
 
 def render(template_name, context):
@@ -24,15 +57,66 @@ def render(template_name, context):
     Returns:
         A dict containing the rendered template.
     """
-    charm_dir = os.path.abspath(
-        os.path.join(os.path.dirname(__file__), os.pardir)
-    )
-    loader = FileSystemLoader(os.path.join(charm_dir, "templates"))
-    return (
-        Environment(loader=loader, autoescape=True)
-        .get_template(template_name)
-        .render(**context)
-    )
+    return _environment().get_template(template_name).render(**context)
+
+
+def config_digest(template_name, context):
+    """Compute a digest of a template and the context used to render it.
+
+    The template modification time is part of the digest so that a charm
+    upgrade shipping a new template invalidates previously applied digests.
+
+    Args:
+        template_name: File name of the template.
+        context: JSON-serializable dict holding the rendering context, or a
+            structure such as a Pebble layer that embeds it.
+
+    Returns:
+        A hex digest which changes whenever the context or template change.
+    """
+    mtime = os.stat(os.path.join(TEMPLATES_DIR, template_name)).st_mtime_ns
+    content = json.dumps(context, sort_keys=True).encode()
+    return hashlib.blake2b(content + str(mtime).encode()).hexdigest()
+
+
+def push_if_changed(container, path, content):
+    """Push a file to the container unless it already has the given content.
+
+    Args:
+        container: The application container.
+        path: Path of the file in the container.
+        content: Expected content of the file.
+
+    Returns:
+        True if the file was pushed, False if it was already up to date.
+    """
+    try:
+        if container.pull(path).read() == content:
+            return False
+    except PathError:
+        pass
+
+    container.push(path, content, make_dirs=True)
+    return True
+
+
+def parse_endpoint(endpoints):
+    """Get the host and port of the first endpoint in a relation.
+
+    Args:
+        endpoints: Comma-separated list of `host:port` endpoints.
+
+    Returns:
+        A (host, port) tuple for the first endpoint.
+
+    Raises:
+        ValueError: if the first endpoint has no port.
+    """
+    first, _, _ = endpoints.partition(",")
+    host, sep, port = first.partition(":")
+    if not sep:
+        raise ValueError(f"endpoint has no port: {first!r}")
+    return host, port
 
 
 def log_event_handler(logger):
@@ -54,6 +138,9 @@ def log_event_handler(logger):
         Returns:
             Decorated method.
         """
+        # The handler name is fixed, so the log lines are built once here.
+        running = f"* running {method.__qualname__}"
+        completed = f"* completed {method.__qualname__}"
 
         @functools.wraps(method)
         def decorated(self, event):
@@ -65,24 +152,104 @@ def log_event_handler(logger):
             Returns:
                 Decorated method.
             """
-            logger.info(
-                f"* running {self.__class__.__name__}.{method.__name__}"
-            )
+            if not logger.isEnabledFor(logging.INFO):
+                return method(self, event)
+
+            logger.info(running)
             try:
                 return method(self, event)
             finally:
-                logger.info(
-                    f"* completed {self.__class__.__name__}.{method.__name__}"
-                )
+                logger.info(completed)
 
         return decorated
 
     return decorator
 
 
+def _status_code(error):
+    """Return the HTTP status code carried by an error, if any.
+
+    Args:
+        error: The exception raised by a request.
+
+    Returns:
+        The HTTP status code, or None for transport errors.
+    """
+    status = getattr(error, "statusCode", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    if status is None or status < 0:
+        return None
+    return status
+
+
+def _retry_after(error):
+    """Return the delay requested by the server through `Retry-After`.
+
+    Args:
+        error: The exception raised by a request.
+
+    Returns:
+        The delay in seconds, or None if the server did not request one.
+    """
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("Retry-After", "")
+    if value.isdigit():
+        return int(value)
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    # HTTP dates are always in GMT, even without an explicit zone.
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+def requires_ready_leader(method):
+    """Run a relation handler only on the leader once peer state is ready.
+
+    Events are deferred until the peer relation is ready, and ignored on
+    units which are not the leader.
+
+    Args:
+        method: relation handler method, whose object holds the charm.
+
+    Returns:
+        Decorated method.
+    """
+
+    @functools.wraps(method)
+    def decorated(self, event):
+        """Check readiness and leadership before handling the event.
+
+        Args:
+            event: The relation event.
+
+        Returns:
+            The result of the handler, or None if it did not run.
+        """
+        if not self.charm._state.is_ready():
+            event.defer()
+            return None
+
+        if not self.charm.unit.is_leader():
+            return None
+
+        return method(self, event)
+
+    return decorated
+
+
 def retry(max_retries=3, delay=2, backoff=2):
     """Decorate function to retry executing upon failure.
 
+    Only transport errors, throttling (429) and server errors (5xx) are
+    retried, as other client errors would fail again in the same way.
+    No charm code uses this decorator yet.
+
     Args:
         max_retries: The maximum number of times to retry the decorated function.
         delay: The initial delay (in seconds) before the first retry.
@@ -102,6 +269,7 @@ def retry(max_retries=3, delay=2, backoff=2):
             wrapper: A decorated function that will be retried upon failure.
         """
 
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             """Execute wrapper for the decorated function and handle retries.
 
@@ -111,31 +279,38 @@ def retry(max_retries=3, delay=2, backoff=2):
 
             Returns:
                 result: The result of the decorated function if successful.
-                None: If max_retries are reached without success, returns None.
 
             Raises:
-                RangerServiceException: If max_retries are reached without success.
+                Exception: The last error, if it cannot be retried or
+                    max_retries are reached without success.
+                ValueError: If max_retries is lower than 1.
             """
             logger = logging.getLogger(__name__)
 
-            current_delay = delay  # Define current_delay before using it
-            for attempt in range(max_retries):
+            current_delay = delay
+            # A server asking to wait longer than the backoff would is not
+            # allowed to block the hook for longer.
+            max_delay = delay * backoff**max_retries
+            for attempt in range(1, max_retries + 1):
                 try:
-                    result = func(*args, **kwargs)
-                    return result
+                    return func(*args, **kwargs)
                 except Exception as e:
-                    if attempt < max_retries - 1:
-                        logger.warning(
-                            f"Request failed (attempt {attempt + 1}): {e}"
-                        )
-                        time.sleep(current_delay)
-                        current_delay *= backoff
-                    else:
+                    status = _status_code(e)
+                    if status is not None and status != 429 and status < 500:
+                        raise
+                    if attempt == max_retries:
                         logger.exception("Max retries reached for request")
-                        raise RangerServiceException(
-                            "Max retries reached for request."
-                        ) from e
-            return None
+                        raise
+                    logger.warning(
+                        "Request failed (attempt %d): %s", attempt, e
+                    )
+                    retry_after = _retry_after(e)
+                    if retry_after is None:
+                        retry_after = current_delay
+                    time.sleep(min(retry_after, max_delay))
+                    current_delay *= backoff
+
+            raise ValueError(f"max_retries must be at least 1: {max_retries}")
 
         return wrapper
 
@@ -171,7 +346,7 @@ def raise_service_error(func):
             result = func(*args, **kwargs)
             return result
         except RangerServiceException:
-            logger.exception(f"Failed to execute {func.__name__}:")
+            logger.exception("Failed to execute %s:", func.__name__)
             raise
 
     return wrapper
@@ -183,9 +358,4 @@ def generate_password():
     Returns:
         String of 32 randomized letter+digit characters
     """
-    return "".join(
-        [
-            secrets.choice(string.ascii_letters + string.digits)
-            for _ in range(32)
-        ]
-    )
+    return "".join(secrets.choice(PASSWORD_ALPHABET) for _ in range(32))
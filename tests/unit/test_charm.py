@@ -11,9 +11,9 @@ import logging
 import re
 from unittest import TestCase, mock
 
-from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus
+from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus, Port
 from ops.pebble import CheckStatus
-from ops.testing import Harness
+from ops.testing import ExecResult, Harness
 
 from charm import RangerK8SCharm
 from state import State
@@ -92,16 +92,22 @@ class MockRangerClient:
         """
         return self.services.get(service_id)
 
-    def get_policies_in_service(self, service_name):
+    def get_policies_in_service(self, service_name, params=None):
         """Mock of get_policies_in_service.
 
         Args:
             service_name: The service from which to get policies.
+            params: Query parameters, such as paging.
 
         Returns:
             policies from the service.
         """
-        return self.policies.get(service_name, [])
+        policies = self.policies.get(service_name, [])
+        if params:
+            start = params["startIndex"]
+            end = start + params["pageSize"]
+            policies = policies[start:end]
+        return policies
 
     def delete_service_by_id(self, service_id):
         """Mock of delete_service_by_id.
@@ -157,6 +163,10 @@ class TestCharm(TestCase):
             BlockedStatus("peer relation not ready"),
         )
 
+        # The peer relation is picked up once it is created.
+        harness.add_relation("peer", "ranger")
+        self.assertTrue(harness.charm._state.is_ready())
+
     def test_admin_ready(self):
         """The pebble plan is correctly generated when the charm is ready."""
         harness = self.harness
@@ -202,6 +212,11 @@ class TestCharm(TestCase):
         )
         self.assertTrue(service.is_running())
 
+        # The application port is opened.
+        self.assertEqual(
+            harness.model.unit.opened_ports(), {Port("tcp", 6080)}
+        )
+
         # The MaintenanceStatus is set with replan message.
         self.assertEqual(
             harness.model.unit.status,
@@ -256,6 +271,9 @@ class TestCharm(TestCase):
         )
         self.assertTrue(service.is_running())
 
+        # No port is opened for usersync.
+        self.assertEqual(harness.model.unit.opened_ports(), set())
+
     def test_config_changed(self):
         """The pebble plan changes according to config changes."""
         harness = self.harness
@@ -394,6 +412,51 @@ class TestCharm(TestCase):
             )
         )
 
+    @mock.patch("charm.RangerProvider._create_ranger_service")
+    @mock.patch("charm.RangerProvider._create_ranger_client")
+    def test_policy_relation_broken_policies_unavailable(
+        self, mock_create_ranger_client, mock_create_ranger_service
+    ):
+        """The service is kept when its policies cannot be read."""
+        harness, rel_id = self.policy_relation_setup()
+
+        mock_ranger_client = MockRangerClient()
+        mock_create_ranger_client.return_value = mock_ranger_client
+        mock_ranger_client.services[rel_id] = MockService(
+            name=f"relation_{rel_id}", service_id=rel_id
+        )
+
+        # The Ranger client returns None when the server is unavailable.
+        event = make_relation_event(rel_id, "trino-k8s", {})
+        with mock.patch.object(
+            mock_ranger_client, "get_policies_in_service", return_value=None
+        ):
+            harness.charm.provider._on_relation_broken(event)
+
+        self.assertIn(rel_id, mock_ranger_client.services)
+        self.assertEqual(
+            harness.model.unit.status,
+            BlockedStatus("Unable to delete service"),
+        )
+
+    def test_create_ranger_service_unavailable(self):
+        """No service is reported when Ranger is unavailable."""
+        ranger = mock.Mock()
+        ranger.get_service.return_value = None
+        ranger.create_service.return_value = None
+        event = make_relation_event(1, "trino-k8s", POLICY_RELATION_DATA)
+
+        (
+            service,
+            is_created,
+        ) = self.harness.charm.provider._create_ranger_service(
+            ranger, POLICY_RELATION_DATA, event, 1000
+        )
+
+        self.assertIsNone(service)
+        self.assertFalse(is_created)
+        ranger.create_service.assert_called_once()
+
     def test_ldap_relation_changed(self):
         """The charm uses the configuration values from ldap relation."""
         harness = self.harness
@@ -501,6 +564,32 @@ class TestCharm(TestCase):
             False,
         )
 
+    @mock.patch("charm.OpensearchRelationHandler.get_secret_content")
+    def test_opensearch_certificate_bundles(self, mock_get_secret_content):
+        """The certificate is read from single or empty TLS CA bundles."""
+        harness = self.harness
+        harness.add_relation("peer", "ranger")
+        handler = harness.charm.opensearch_relation_handler
+        event = make_relation_event(1, "opensearch", {"secret-tls": "tls"})
+        certificate = (
+            "-----BEGIN CERTIFICATE-----\nMIIC\n-----END CERTIFICATE-----"
+        )
+
+        # A CA sent alone is used as the certificate.
+        mock_get_secret_content.return_value = {"tls-ca": certificate}
+        handler.get_cert_value(event)
+        self.assertEqual(
+            harness.charm._state.opensearch_certificate, certificate
+        )
+
+        # A bundle without certificates leaves the certificate unchanged.
+        mock_get_secret_content.return_value = {"tls-ca": ""}
+        with self.assertLogs(level="WARNING"):
+            handler.get_cert_value(event)
+        self.assertEqual(
+            harness.charm._state.opensearch_certificate, certificate
+        )
+
 
 def simulate_usersync_lifecycle(harness):
     """Simulate a healthy charm life-cycle.
@@ -605,6 +694,151 @@ def make_database_changed_event():
     )
 
 
+class TestCaching(TestCase):
+    """Unit tests for the work skipped when inputs are unchanged.
+
+    Attrs:
+        maxDiff: Specifies max difference shown by failed tests.
+    """
+
+    maxDiff = None
+
+    def setUp(self):
+        """Set up for the unit tests."""
+        self.harness = Harness(RangerK8SCharm)
+        self.addCleanup(self.harness.cleanup)
+        self.harness.set_can_connect("ranger", True)
+        self.harness.set_leader(True)
+        self.harness.set_model_name("ranger-model")
+        self.harness.add_network("10.0.0.10", endpoint="peer")
+        self.harness.begin()
+
+    def test_config_unchanged(self):
+        """The pebble layer is not re-applied when the config is unchanged."""
+        harness = self.harness
+        simulate_admin_lifecycle(harness)
+
+        container = harness.model.unit.get_container("ranger")
+        container.get_check = mock.Mock(status="up")
+        container.get_check.return_value.status = CheckStatus.UP
+        with mock.patch.object(container, "add_layer") as add_layer:
+            harness.charm.on.config_changed.emit()
+
+        add_layer.assert_not_called()
+        self.assertEqual(
+            harness.model.unit.status, ActiveStatus("Status check: UP")
+        )
+
+    def test_install_properties_unchanged(self):
+        """The install.properties file is not pushed again when unchanged."""
+        harness = self.harness
+        simulate_admin_lifecycle(harness)
+        harness.charm._stored.applied_digest = None
+
+        container = harness.model.unit.get_container("ranger")
+        with mock.patch.object(container, "push") as push:
+            harness.charm.on.config_changed.emit()
+
+        push.assert_not_called()
+        self.assertEqual(
+            harness.model.unit.status,
+            MaintenanceStatus("replanning application"),
+        )
+
+    def test_failed_truststore_update_retried(self):
+        """The applied digest is only recorded once the truststore is set."""
+        harness = self.harness
+        simulate_admin_lifecycle(harness)
+        harness.charm._stored.applied_digest = None
+
+        harness.handle_exec(
+            "ranger", ["keytool"], result=ExecResult(exit_code=1)
+        )
+        harness.charm.on.config_changed.emit()
+        self.assertIsNone(harness.charm._stored.applied_digest)
+
+        harness.handle_exec("ranger", ["keytool"], result=0)
+        harness.charm.on.config_changed.emit()
+        self.assertIsNotNone(harness.charm._stored.applied_digest)
+
+    def test_validation_remembered(self):
+        """Validation is skipped while config and state are unchanged."""
+        harness = self.harness
+        simulate_admin_lifecycle(harness)
+
+        container = harness.model.unit.get_container("ranger")
+        container.get_check = mock.Mock(status="up")
+        container.get_check.return_value.status = CheckStatus.UP
+        harness.charm.on.config_changed.emit()
+
+        with mock.patch.object(
+            harness.charm.postgres_relation_handler, "validate"
+        ) as validate:
+            harness.charm.on.config_changed.emit()
+            validate.assert_not_called()
+
+            harness.update_config({"lookup-timeout": 5000})
+            validate.assert_called_once()
+
+    @mock.patch("charm.RangerProvider._create_ranger_service")
+    @mock.patch("charm.RangerProvider._create_ranger_client")
+    def test_policy_relation_unchanged(
+        self, mock_create_ranger_client, mock_create_ranger_service
+    ):
+        """Unchanged policy relation data does not query Ranger again."""
+        harness = self.harness
+        simulate_admin_lifecycle(harness)
+
+        rel_id = harness.add_relation("policy", "trino-k8s")
+        harness.add_relation_unit(rel_id, "trino-k8s/0")
+        mock_create_ranger_service.return_value = (
+            MockService(f"relation_{rel_id}", rel_id),
+            True,
+        )
+
+        event = make_relation_event(rel_id, "trino-k8s", POLICY_RELATION_DATA)
+        harness.charm.provider._on_relation_changed(event)
+        harness.charm.provider._on_relation_changed(event)
+
+        # The client is only created for the initial relation change.
+        mock_create_ranger_client.assert_called_once()
+
+        # Services are set up again once Ranger uses another database.
+        harness.charm._state.database_connection = {"host": "other-db"}
+        harness.charm.provider._on_relation_changed(event)
+        self.assertEqual(mock_create_ranger_client.call_count, 2)
+        self.assertIsNone(harness.charm._state.policy_digests)
+
+    @mock.patch("apache_ranger.client.ranger_client.RangerClient")
+    def test_ranger_client_reused(self, mock_ranger_client):
+        """The Ranger client is reused until the admin password changes."""
+        provider = self.harness.charm.provider
+
+        client = provider._create_ranger_client("rangerR0cks!")
+        self.assertIs(provider._create_ranger_client("rangerR0cks!"), client)
+        mock_ranger_client.assert_called_once()
+
+        provider._create_ranger_client("newR0cks!pwd")
+        self.assertEqual(mock_ranger_client.call_count, 2)
+
+    def test_has_custom_policies_paged(self):
+        """Policies are fetched page by page until a custom one is found."""
+        provider = self.harness.charm.provider
+        ranger = MockRangerClient()
+        ranger.policies["trino"] = [
+            {
+                "id": policy_id,
+                "name": "all - catalog",
+                "policyItems": [{"users": ["relation_id_1"]}],
+            }
+            for policy_id in range(60)
+        ]
+        self.assertFalse(provider._has_custom_policies(ranger, "trino", 1))
+
+        ranger.policies["trino"].append({"name": "custom", "policyItems": []})
+        self.assertTrue(provider._has_custom_policies(ranger, "trino", 1))
+
+
 class TestState(TestCase):
     """Unit tests for state.
 
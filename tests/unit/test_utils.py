@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Helper unit tests."""
+
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest import mock
+
+import pytest
+import requests
+
+from utils import parse_endpoint, retry
+
+
+def http_error(status, headers=None):
+    """Create an HTTP error carrying the given response status.
+
+    Args:
+        status: HTTP status code of the response.
+        headers: HTTP headers of the response.
+
+    Returns:
+        A requests HTTPError.
+    """
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.HTTPError(response=response)
+
+
+@mock.patch("utils.time.sleep")
+def test_retry_server_error(sleep) -> None:
+    """Server errors are retried with backoff until the call succeeds."""
+    func = mock.Mock(side_effect=[http_error(503), http_error(500), "ok"])
+
+    assert retry(max_retries=3, delay=2, backoff=2)(func)() == "ok"
+    assert func.call_count == 3
+    assert sleep.call_args_list == [mock.call(2), mock.call(4)]
+
+
+@mock.patch("utils.time.sleep")
+def test_retry_client_error(sleep) -> None:
+    """Client errors are raised without being retried."""
+    func = mock.Mock(side_effect=http_error(404))
+
+    with pytest.raises(requests.HTTPError):
+        retry()(func)()
+    func.assert_called_once()
+    sleep.assert_not_called()
+
+
+@mock.patch("utils.time.sleep")
+def test_retry_exhausted(sleep) -> None:
+    """The last error is raised once retries are exhausted."""
+    error = http_error(429, {"Retry-After": "7"})
+    func = mock.Mock(side_effect=error)
+
+    with pytest.raises(requests.HTTPError) as raised:
+        retry(max_retries=2)(func)()
+    assert raised.value is error
+    assert func.call_count == 2
+    sleep.assert_called_once_with(7)
+
+
+@mock.patch("utils.time.sleep")
+def test_retry_after_capped(sleep) -> None:
+    """A long Retry-After delay is capped to the maximum backoff."""
+    func = mock.Mock(side_effect=[http_error(503, {"Retry-After": "3600"}), 1])
+
+    assert retry(max_retries=3, delay=2, backoff=2)(func)() == 1
+    sleep.assert_called_once_with(16)
+
+
+@mock.patch("utils.time.sleep")
+def test_retry_after_http_date(sleep) -> None:
+    """An HTTP-date Retry-After is waited for, up to the maximum backoff."""
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    headers = {"Retry-After": format_datetime(retry_at, usegmt=True)}
+    func = mock.Mock(side_effect=[http_error(503, headers), 1])
+
+    assert retry(max_retries=3, delay=2, backoff=2)(func)() == 1
+    sleep.assert_called_once_with(16)
+
+    headers = {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}
+    func = mock.Mock(side_effect=[http_error(503, headers), 1])
+    sleep.reset_mock()
+
+    assert retry(max_retries=3, delay=2, backoff=2)(func)() == 1
+    sleep.assert_called_once_with(0)
+
+
+def test_retry_without_attempts() -> None:
+    """A retry decorator allowing no attempt is rejected."""
+    func = mock.Mock()
+
+    with pytest.raises(ValueError):
+        retry(max_retries=0)(func)()
+    func.assert_not_called()
+
+
+def test_parse_endpoint() -> None:
+    """The host and port of the first endpoint are returned."""
+    assert parse_endpoint("db-0:5432,db-1:5432") == ("db-0", "5432")
+    assert parse_endpoint("opensearch-host:9200") == (
+        "opensearch-host",
+        "9200",
+    )
+
+    with pytest.raises(ValueError):
+        parse_endpoint("db-0")